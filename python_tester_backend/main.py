@@ -1,11 +1,17 @@
 import docker
 import os
+import asyncio
+import io
 import time
 import tempfile
 import zipfile 
+import tarfile
 import shutil  
 import pathlib
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import queue
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
@@ -46,12 +52,79 @@ DOCKER_IMAGES = {
     "java-project": "maven:3.9-eclipse-temurin-17" 
 }
 
+# Images already confirmed present locally, with the time they were last confirmed.
+# Entries older than IMAGE_CACHE_TTL are re-checked against the Docker daemon.
+IMAGE_CACHE_TTL = 3600
+_IMAGE_CACHE: set[str] = set()
+_IMAGE_CACHE_TS: dict[str, float] = {}
+
 RUN_COMMANDS = {
     "python": ["python", "-m", "unittest", "test_code.py"],
     "javascript": ["node", "test_code.js"],
     "java": ["sh", "-c", "javac TestRunner.java && java TestRunner"],
 }
 
+# Idle containers kept warm per single-file language. Tests are exec'd into them
+# instead of paying containers.run() on every request. Each container serves a
+# single run and is replaced in the background, so nothing a test leaves behind
+# (processes, installed packages, files) reaches the next user.
+POOL_SIZE = 2
+_CONTAINER_POOL: dict[str, queue.Queue] = {language: queue.Queue() for language in RUN_COMMANDS}
+_POOL_STOPPED = threading.Event()
+
+# exec_run has no timeout of its own, so the limit is enforced inside the
+# container; -k follows up with SIGKILL for tests that ignore SIGTERM
+EXEC_TIME_LIMIT = 300
+EXEC_TIMEOUT_PREFIX = ["timeout", "-k", "5", str(EXEC_TIME_LIMIT)]
+
+# Used to place flat Java sources into the Maven layout
+_JAVA_CLASS_RE = re.compile(r'public\s+class\s+(\w+)')
+_JAVA_PACKAGE_RE = re.compile(r'^\s*package\s+([\w.]+);', re.MULTILINE)
+JAVA_HEAD_BYTES = 4096
+
+# Used by sanitize_java_code; each match consumes its whole line
+_IMPORT_LINE_RE = re.compile(r'^([ \t]*import[ \t][^\n]*;)[ \t\r]*(?:\n|$)', re.MULTILINE)
+_PACKAGE_LINE_RE = re.compile(r'^[ \t]*package[ \t][^\n]*(?:\n|$)', re.MULTILINE)
+
+# Cap on captured container output so a runaway test cannot exhaust memory
+MAX_LOG_BYTES = 4 * 1024 * 1024
+
+# Buffer size for copying uploaded ZIPs to disk (shutil's default is 16 KiB)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Uploads up to this size are extracted from memory without touching disk
+ZIP_IN_MEMORY_LIMIT = 100 * 1024 * 1024
+
+# --- Generated Test Harnesses ---
+
+# Smoke test injected into Python projects that ship without any tests
+_SMOKE_TEST_PY = b"""
+import unittest
+import os
+import importlib
+import sys
+from unittest.mock import MagicMock
+sys.modules["tkinter"] = MagicMock()
+sys.modules["turtle"] = MagicMock()
+sys.modules["pygame"] = MagicMock()
+class TestProjectStructure(unittest.TestCase):
+    def test_files_importable(self):
+        print("\\n--- Checking Project Files ---")
+        files = [f[:-3] for f in os.listdir('.') if f.endswith('.py') and f != 'test_smoke_generated.py']
+        if not files: self.fail("No Python files found!")
+        for module_name in files:
+            try:
+                importlib.import_module(module_name)
+                print(f"[OK] Loaded: {module_name}.py") 
+            except Exception as e:
+                print(f"[FAIL] Failed: {module_name}.py")
+                self.fail(f"Error importing {module_name}.py: {e}")
+if __name__ == '__main__': unittest.main()
+"""
+
+# package.json and runner injected into plain HTML/JS frontend projects
+_FRONTEND_PKG_JSON = b"""{"name": "frontend-test","version": "1.0.0","scripts": {"test": "node test_runner.js"},"dependencies": {"jsdom": "^24.0.0"}}"""
+_FRONTEND_TEST_RUNNER_JS = b"""const fs = require('fs'); const jsdom = require("jsdom"); const { JSDOM } = jsdom; try { const html = fs.readFileSync('index.html', 'utf8'); const scriptContent = fs.readFileSync('script.js', 'utf8'); const dom = new JSDOM(html, { runScripts: "dangerously", resources: "usable" }); const { window } = dom; window.eval(scriptContent); console.log("[OK] script.js loaded successfully."); console.log("[OK] DOM initialized successfully."); } catch (error) { console.error("[FAIL] Test Failed:", error); process.exit(1); }"""
+
 # --- API Models ---
 
 class CodeInput(BaseModel):
@@ -64,32 +137,301 @@ class TestResult(BaseModel):
     summary: str
     output: str
 
+# --- HELPER: Docker Image Cache ---
+
+def _mark_image_present(image_name: str) -> None:
+    _IMAGE_CACHE.add(image_name)
+    _IMAGE_CACHE_TS[image_name] = time.time()
+
+def ensure_image(image_name: str) -> bool:
+    """
+    Returns True if the image is available locally, consulting the process-local
+    cache before asking the Docker daemon. Raises docker.errors.ImageNotFound
+    if the image still has to be pulled.
+    """
+    if image_name in _IMAGE_CACHE and time.time() - _IMAGE_CACHE_TS[image_name] < IMAGE_CACHE_TTL:
+        return True
+    try:
+        client.images.get(image_name)
+    except docker.errors.ImageNotFound:
+        _IMAGE_CACHE.discard(image_name)
+        raise
+    _mark_image_present(image_name)
+    return True
+
+def _pull_image(image_name: str) -> None:
+    try:
+        print(f"Image '{image_name}' not found. Starting download...")
+        client.images.pull(image_name)
+        _mark_image_present(image_name)
+        print(f"Image pull complete: {image_name}")
+    except Exception as e:
+        print(f"Failed to pull image '{image_name}': {e}")
+
+@app.on_event("startup")
+def populate_image_cache():
+    # One images.list() call up front instead of an images.get() per language
+    wanted = set(DOCKER_IMAGES.values())
+    try:
+        for image in client.images.list():
+            for tag in image.tags:
+                if tag in wanted:
+                    _mark_image_present(tag)
+    except Exception as e:
+        print(f"Could not list Docker images: {e}")
+        return
+
+    # Pull whatever is missing in the background, so the server starts accepting
+    # requests right away; until a pull finishes, requests for that language get
+    # the "Downloading Environment..." response
+    missing = wanted - _IMAGE_CACHE
+    if missing:
+        threading.Thread(target=_pull_missing_images, args=(missing,), daemon=True).start()
+
+def _pull_missing_images(missing: set[str]) -> None:
+    with ThreadPoolExecutor(max_workers=len(missing)) as ex:
+        list(ex.map(_pull_image, missing))
+    # Languages whose image only just arrived get their warm containers now
+    for language in RUN_COMMANDS:
+        if DOCKER_IMAGES[language] in missing and DOCKER_IMAGES[language] in _IMAGE_CACHE:
+            _fill_pool(language)
+
+# --- HELPER: Warm Container Pool ---
+
+def _start_pool_container(image_name: str):
+    # No bind mounts: the test files are copied into /app of this container only
+    return client.containers.run(
+        image=image_name,
+        working_dir='/app',
+        command=["sleep", "infinity"],
+        detach=True,
+        auto_remove=True
+    )
+
+def _replace_pool_container(language: str, used_container) -> None:
+    # Runs on a background thread, off the request path
+    try: used_container.kill()
+    except: pass
+    if _POOL_STOPPED.is_set():
+        return
+    try:
+        container = _start_pool_container(DOCKER_IMAGES[language])
+    except Exception as e:
+        print(f"Could not start warm container for {language}: {e}")
+        return
+    _CONTAINER_POOL[language].put(container)
+    # Shutdown may have drained the pool while this container was starting
+    if _POOL_STOPPED.is_set():
+        try: container.kill()
+        except: pass
+
+def _tar_directory(directory: pathlib.Path) -> bytes:
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w') as tar:
+        for path in directory.iterdir():
+            tar.add(path, arcname=path.name)
+    return buf.getvalue()
+
+def _fill_pool(language: str) -> None:
+    pool = _CONTAINER_POOL[language]
+    while pool.qsize() < POOL_SIZE and not _POOL_STOPPED.is_set():
+        try:
+            pool.put(_start_pool_container(DOCKER_IMAGES[language]))
+        except Exception as e:
+            print(f"Could not start warm container for {language}: {e}")
+            break
+
+@app.on_event("startup")
+def start_container_pool():
+    for language in RUN_COMMANDS:
+        # Images that are still being pulled are filled in by _pull_missing_images
+        if DOCKER_IMAGES[language] in _IMAGE_CACHE:
+            _fill_pool(language)
+
+@app.on_event("shutdown")
+def stop_container_pool():
+    _POOL_STOPPED.set()
+    for pool in _CONTAINER_POOL.values():
+        while True:
+            try:
+                container = pool.get_nowait()
+            except queue.Empty:
+                break
+            try: container.kill()
+            except: pass
+
+def exec_in_warm_container(language: str, workspace: pathlib.Path, run_command: list[str]):
+    """
+    Copies the workspace into an idle pooled container and runs the test command
+    there. The container is discarded afterwards and a fresh one started in its place.
+    Returns (exit_code, logs, timed_out), or None if no warm container could
+    serve the run. Errors after the tests have started are raised instead, so
+    they are never run a second time on the cold path.
+    """
+    pool = _CONTAINER_POOL.get(language)
+    if pool is None:
+        return None
+    try:
+        container = pool.get_nowait()
+    except queue.Empty:
+        return None
+
+    try:
+        try:
+            container.put_archive('/app', _tar_directory(workspace))
+            # Streamed through the low-level API, so output is capped as it arrives
+            # and the exit code can still be read once the command finishes
+            exec_id = client.api.exec_create(
+                container.id,
+                [*EXEC_TIMEOUT_PREFIX, *run_command],
+                workdir='/app'
+            )['Id']
+        except Exception as e:
+            # Nothing has run yet, so the cold path can take over
+            print(f"Warm container for {language} failed, discarding it: {e}")
+            return None
+
+        started = time.monotonic()
+        buf = bytearray()
+        full = False
+        for chunk in client.api.exec_start(exec_id, stream=True):
+            # Past the cap the output is drained and dropped so the command can finish
+            if not full:
+                full = _append_capped(buf, chunk)
+        exit_code = client.api.exec_inspect(exec_id)['ExitCode']
+    finally:
+        threading.Thread(target=_replace_pool_container, args=(language, container), daemon=True).start()
+
+    # `timeout` exits 124 on TERM, or 137 if its KILL follow-up was needed;
+    # a 137 before the limit is the test itself being killed (e.g. out of memory)
+    timed_out = exit_code == 124 or (exit_code == 137 and time.monotonic() - started >= EXEC_TIME_LIMIT)
+    return exit_code, _decode_logs(buf), timed_out
+
+# --- HELPER: Container Log Streaming ---
+
+def _append_capped(buf: bytearray, chunk: bytes) -> bool:
+    """
+    Appends chunk to buf without growing it past MAX_LOG_BYTES.
+    Returns True once the cap has been reached.
+    """
+    remaining = MAX_LOG_BYTES - len(buf)
+    buf.extend(chunk[:remaining])
+    return len(chunk) >= remaining
+
+def _decode_logs(buf: bytearray) -> str:
+    logs = bytes(buf).decode('utf-8', 'replace')
+    if len(buf) >= MAX_LOG_BYTES:
+        logs += "\n[Output truncated]"
+    return logs
+
+class LogCollector:
+    """
+    Follows a container's stdout/stderr on a background thread while it runs,
+    so the output is already buffered when the container exits.
+    """
+
+    def __init__(self, container):
+        self._buf = bytearray()
+        self._stream = container.logs(stream=True, follow=True, stdout=True, stderr=True)
+        self._thread = threading.Thread(target=self._collect, daemon=True)
+        self._thread.start()
+
+    def _collect(self):
+        try:
+            for chunk in self._stream:
+                if _append_capped(self._buf, chunk):
+                    break
+        except Exception as e:
+            print(f"Log streaming stopped: {e}")
+        finally:
+            try: self._stream.close()
+            except: pass
+
+    def result(self, timeout: float = 5) -> str:
+        self._thread.join(timeout=timeout)
+        return _decode_logs(self._buf)
+
 # --- HELPER: Java Code Sanitizer ---
 def sanitize_java_code(source_code: str) -> str:
     """
     Moves all import statements to the top of the Java file
     to prevent compilation errors if the AI places them mid-file.
     """
-    lines = source_code.splitlines()
-    imports = []
-    code_body = []
-    
-    for line in lines:
-        stripped = line.strip()
-        # Check for imports
-        if stripped.startswith("import ") and stripped.endswith(";"):
-            imports.append(line)
-        # Remove package declarations (single file runner uses default package)
-        elif stripped.startswith("package "):
-             pass 
-        else:
-            code_body.append(line)
-            
+    # Fast path: no package line and no import after the first class,
+    # i.e. the file is already in the shape javac needs
+    boundary = source_code.find("class ")
+    if (
+        boundary != -1
+        and not _PACKAGE_LINE_RE.search(source_code)
+        and not _IMPORT_LINE_RE.search(source_code, boundary)
+    ):
+        return source_code
+
     # Remove duplicate imports while preserving order
-    unique_imports = list(dict.fromkeys(imports))
-    
+    imports = list(dict.fromkeys(_IMPORT_LINE_RE.findall(source_code)))
+
+    # Drop imports from the body, along with package declarations
+    # (single file runner uses default package)
+    code_body = _PACKAGE_LINE_RE.sub('', _IMPORT_LINE_RE.sub('', source_code))
+
     # Reassemble: Imports first, then the rest of the code
-    return "\n".join(unique_imports + [""] + code_body)
+    return "\n".join(imports) + "\n\n" + code_body
+
+# --- HELPER: Parallel ZIP Extraction ---
+
+def _extract_member(zip_ref: zipfile.ZipFile, member: zipfile.ZipInfo, dest: pathlib.Path) -> None:
+    try:
+        zip_ref.extract(member, dest)
+    except FileExistsError:
+        # Another worker created the same parent directory first; it exists now
+        zip_ref.extract(member, dest)
+
+def extract_zip(zip_ref: zipfile.ZipFile, dest: pathlib.Path) -> None:
+    """
+    Equivalent to zip_ref.extractall(dest), but decompresses members across
+    a thread pool since zlib releases the GIL.
+    """
+    members = zip_ref.infolist()
+    if len(members) < 2:
+        zip_ref.extractall(dest)
+        return
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as ex:
+        list(ex.map(lambda member: _extract_member(zip_ref, member, dest), members))
+
+# --- HELPER: Project Inspection ---
+
+def find_public_class(source: str) -> str | None:
+    # Plain string scan first; the regex only runs when it is inconclusive
+    idx = source.find("class ")
+    if idx > 0 and source[:idx].rstrip().endswith("public"):
+        tokens = source[idx + 6:].split(None, 1)
+        if tokens and tokens[0].rstrip("{").isidentifier():
+            return tokens[0].rstrip("{")
+    class_match = _JAVA_CLASS_RE.search(source)
+    return class_match.group(1) if class_match else None
+
+def find_package(source: str) -> str | None:
+    if source.startswith("package "):
+        end = source.find(";")
+        # Same rules as _JAVA_PACKAGE_RE: whitespace before the name, none before ';'
+        package_name = source[8:end].lstrip() if end != -1 else ""
+        if package_name and all(part.isidentifier() for part in package_name.split(".")):
+            return package_name
+    package_match = _JAVA_PACKAGE_RE.search(source)
+    return package_match.group(1) if package_match else None
+
+def has_pytest_files(directory: pathlib.Path) -> bool:
+    """
+    Checks for test_*.py / *_test.py files in a single directory pass,
+    stopping at the first match.
+    """
+    with os.scandir(directory) as it:
+        return any(
+            entry.name.endswith(".py")
+            and (entry.name.startswith("test_") or entry.name.endswith("_test.py"))
+            and entry.is_file()
+            for entry in it
+        )
 
 # --- HELPER 1: Run Single File (Updated) ---
 
@@ -102,11 +444,12 @@ def run_in_docker(language: str, code: str, test_code: str) -> TestResult:
     run_command = RUN_COMMANDS[language]
     
     try:
-        client.images.get(image_name)
+        ensure_image(image_name)
     except docker.errors.ImageNotFound:
         try:
             print(f"Image '{image_name}' not found. Starting download...")
             client.images.pull(image_name) 
+            _mark_image_present(image_name)
             print(f"Image pull complete: {image_name}")
             return TestResult(
                 success=False,
@@ -123,63 +466,80 @@ def run_in_docker(language: str, code: str, test_code: str) -> TestResult:
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Docker error: {e}")
 
-    temp_dir = pathlib.Path(tempfile.gettempdir()) / f"codetester_{os.getpid()}_{time.time()}"
-    temp_dir.mkdir(parents=True, exist_ok=True)
-    
-    container = None
-    try:
-        if language == "java":
-            # --- USE SANITIZER HERE ---
-            # Fix imports before writing to file
-            clean_code = sanitize_java_code(test_code)
-            test_path = temp_dir / "TestRunner.java"
-            with open(test_path, 'w', encoding='utf-8') as f:
-                f.write(clean_code)
-        else:
-            code_filename = "user_code.py" if language == "python" else "user_code.js"
-            test_filename = "test_code.py" if language == "python" else "test_code.js"
-            code_path = temp_dir / code_filename
-            with open(code_path, 'w', encoding='utf-8') as f:
-                f.write(code)
-            test_path = temp_dir / test_filename
-            with open(test_path, 'w', encoding='utf-8') as f:
-                f.write(test_code)
-
-        container = client.containers.run(
-            image=image_name,
-            volumes={str(temp_dir): {'bind': '/app', 'mode': 'rw'}},
-            working_dir='/app',
-            command=run_command,
-            detach=True,
-            remove=False 
-        )
-
+    with tempfile.TemporaryDirectory(prefix="codetester_", ignore_cleanup_errors=True) as td:
+        temp_dir = pathlib.Path(td)
+        container = None
         try:
-            # 300s timeout
-            result = container.wait(timeout=300) 
-            exit_code = result.get("StatusCode", 1) 
-        except Exception as e:
-            return TestResult(
-                success=False,
-                summary="Code execution timed out (5 minutes).",
-                output=f"Timeout: The test run exceeded the 5-minute limit."
-            )
-
-        logs = container.logs(stdout=True, stderr=True).decode('utf-8')
-
-        if exit_code == 0:
-            return TestResult(success=True, summary="All tests passed!", output=logs)
-        else:
-            return TestResult(success=False, summary="Tests Failed or Code Error", output=logs)
+            if language == "java":
+                # --- USE SANITIZER HERE ---
+                # Fix imports before writing to file
+                clean_code = sanitize_java_code(test_code)
+                test_path = temp_dir / "TestRunner.java"
+                with open(test_path, 'w', encoding='utf-8') as f:
+                    f.write(clean_code)
+            else:
+                code_filename = "user_code.py" if language == "python" else "user_code.js"
+                test_filename = "test_code.py" if language == "python" else "test_code.js"
+                code_path = temp_dir / code_filename
+                with open(code_path, 'w', encoding='utf-8') as f:
+                    f.write(code)
+                test_path = temp_dir / test_filename
+                with open(test_path, 'w', encoding='utf-8') as f:
+                    f.write(test_code)
+
+            warm_result = exec_in_warm_container(language, temp_dir, run_command)
+            if warm_result is not None:
+                exit_code, logs, timed_out = warm_result
+                if timed_out:
+                    return TestResult(
+                        success=False,
+                        summary="Code execution timed out (5 minutes).",
+                        output=f"Timeout: The test run exceeded the 5-minute limit."
+                    )
+                if exit_code == 137:
+                    return TestResult(
+                        success=False,
+                        summary="Test process was killed (e.g. out of memory).",
+                        output=logs
+                    )
+            else:
+                # Cold path: no warm container available
+                container = client.containers.run(
+                    image=image_name,
+                    # Writable, like /app in a pooled container: tests may create files
+                    volumes={str(temp_dir): {'bind': '/app', 'mode': 'rw'}},
+                    working_dir='/app',
+                    command=run_command,
+                    detach=True,
+                    remove=False 
+                )
+                log_collector = LogCollector(container)
+
+                try:
+                    # 300s timeout
+                    result = container.wait(timeout=300) 
+                    exit_code = result.get("StatusCode", 1) 
+                except Exception as e:
+                    return TestResult(
+                        success=False,
+                        summary="Code execution timed out (5 minutes).",
+                        output=f"Timeout: The test run exceeded the 5-minute limit."
+                    )
+
+                logs = log_collector.result()
+
+            if exit_code == 0:
+                return TestResult(success=True, summary="All tests passed!", output=logs)
+            else:
+                return TestResult(success=False, summary="Tests Failed or Code Error", output=logs)
 
-    except Exception as e:
-        return TestResult(success=False, summary="Docker Execution Error", output=f"An unexpected error occurred: {str(e)}")
-    finally:
-        if container:
-            try: container.stop(timeout=1); container.remove(v=True, force=True)
-            except: pass 
-        if temp_dir.exists():
-             shutil.rmtree(temp_dir, ignore_errors=True)
+        except Exception as e:
+            return TestResult(success=False, summary="Docker Execution Error", output=f"An unexpected error occurred: {str(e)}")
+        finally:
+            if container:
+                # force=True kills a still-running container, so no separate stop() call
+                try: container.remove(v=True, force=True)
+                except: pass 
 
 
 # --- HELPER 2: Run Project ZIP (Unchanged) ---
@@ -202,11 +562,12 @@ def run_project_in_docker(language: str, zip_file: UploadFile) -> TestResult:
         raise HTTPException(status_code=400, detail="Unsupported project language.")
 
     try:
-        client.images.get(image_name)
+        ensure_image(image_name)
     except docker.errors.ImageNotFound:
         try:
             print(f"Image '{image_name}' not found. Downloading...")
             client.images.pull(image_name)
+            _mark_image_present(image_name)
             print(f"Image pull complete: {image_name}")
             return TestResult(success=False, summary="Downloading Environment...", output=f"The {language} project environment was not found. The download has completed. Please re-upload the project.")
         except Exception as pull_error:
@@ -214,144 +575,131 @@ def run_project_in_docker(language: str, zip_file: UploadFile) -> TestResult:
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Docker error: {e}")
 
-    temp_dir = pathlib.Path(tempfile.gettempdir()) / f"codetester_proj_{os.getpid()}_{time.time()}"
-    temp_dir.mkdir(parents=True, exist_ok=True)
-    
-    container = None
-    try:
-        zip_path = temp_dir / "project.zip"
+    with tempfile.TemporaryDirectory(prefix="codetester_proj_", ignore_cleanup_errors=True) as td:
+        temp_dir = pathlib.Path(td)
+        container = None
         try:
-            with open(zip_path, "wb") as f:
-                shutil.copyfileobj(zip_file.file, f)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to save zip file: {e}")
-        finally:
-            zip_file.file.close()
+            try:
+                # Archives up to ZIP_IN_MEMORY_LIMIT are opened straight from memory;
+                # only larger uploads are spilled to disk first.
+                data = zip_file.file.read(ZIP_IN_MEMORY_LIMIT + 1)
+                if len(data) <= ZIP_IN_MEMORY_LIMIT:
+                    zip_source = io.BytesIO(data)
+                else:
+                    zip_source = temp_dir / "project.zip"
+                    with open(zip_source, "wb") as f:
+                        f.write(data)
+                        del data
+                        shutil.copyfileobj(zip_file.file, f, length=UPLOAD_CHUNK_SIZE)
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Failed to save zip file: {e}")
+            finally:
+                zip_file.file.close()
 
-        try:
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(temp_dir)
-        except Exception as e:
-            return TestResult(success=False, summary="ZIP Error", output=f"Invalid .zip file. Error: {e}")
+            try:
+                with zipfile.ZipFile(zip_source, 'r') as zip_ref:
+                    extract_zip(zip_ref, temp_dir)
+            except Exception as e:
+                return TestResult(success=False, summary="ZIP Error", output=f"Invalid .zip file. Error: {e}")
+            # The upload is no longer needed; don't hold it for the whole container run
+            data = zip_source = None
         
-        if language == "java":
-            if not (temp_dir / "pom.xml").exists():
-                 return TestResult(success=False, summary="Invalid Project", output="No 'pom.xml' found. Please include a pom.xml file.")
+            if language == "java":
+                if not (temp_dir / "pom.xml").exists():
+                     return TestResult(success=False, summary="Invalid Project", output="No 'pom.xml' found. Please include a pom.xml file.")
             
-            if not (temp_dir / "src" / "main" / "java").exists():
-                print("Flat Java structure detected. Reorganizing for Maven...")
-                src_main = temp_dir / "src" / "main" / "java"
-                src_main.mkdir(parents=True, exist_ok=True)
+                if not (temp_dir / "src" / "main" / "java").exists():
+                    print("Flat Java structure detected. Reorganizing for Maven...")
+                    src_main = temp_dir / "src" / "main" / "java"
+                    src_main.mkdir(parents=True, exist_ok=True)
                 
-                for item in list(temp_dir.iterdir()):
-                    if item.name.endswith(".java"):
-                        try:
-                            with open(item, 'r', encoding='utf-8') as f:
-                                content = f.read()
-                                class_match = re.search(r'public\s+class\s+(\w+)', content)
+                    for item in list(temp_dir.iterdir()):
+                        if item.name.endswith(".java"):
+                            try:
+                                # Declarations sit at the top of the file, so only the head is
+                                # read; the body stays on disk and is renamed untouched
+                                # (same temp dir, so a plain rename always works).
+                                with open(item, 'rb') as f:
+                                    head = f.read(JAVA_HEAD_BYTES).decode('utf-8', 'ignore')
+                                    detected_class = find_public_class(head)
+                                    if not detected_class:
+                                        # e.g. a long license header; fall back to the whole file
+                                        head += f.read().decode('utf-8', 'ignore')
+                                        detected_class = find_public_class(head)
+
                                 target_filename = item.name
-                                if class_match:
-                                    detected_class = class_match.group(1)
-                                    if item.stem != detected_class:
-                                        target_filename = f"{detected_class}.java"
-
-                                package_match = re.search(r'^\s*package\s+([\w.]+);', content, re.MULTILINE)
-                                if package_match:
-                                    package_name = package_match.group(1)
+                                if detected_class and item.stem != detected_class:
+                                    target_filename = f"{detected_class}.java"
+
+                                package_name = find_package(head)
+                                if package_name:
                                     package_path = package_name.replace('.', '/')
                                     target_dir = src_main / package_path
                                     target_dir.mkdir(parents=True, exist_ok=True)
-                                    shutil.move(str(item), str(target_dir / target_filename))
+                                    os.replace(item, target_dir / target_filename)
                                 else:
-                                    shutil.move(str(item), str(src_main / target_filename))
-                        except Exception as e:
-                            print(f"Error processing {item.name}: {e}")
-
-        elif language == "python":
-            req_file = None
-            if (temp_dir / "requirements.txt").exists(): req_file = "requirements.txt"
-            elif (temp_dir / "requirement.txt").exists(): req_file = "requirement.txt"
+                                    os.replace(item, src_main / target_filename)
+                            except Exception as e:
+                                print(f"Error processing {item.name}: {e}")
+
+            elif language == "python":
+                req_file = None
+                if (temp_dir / "requirements.txt").exists(): req_file = "requirements.txt"
+                elif (temp_dir / "requirement.txt").exists(): req_file = "requirement.txt"
             
-            install_cmd = ""
-            if req_file and (temp_dir / req_file).stat().st_size > 0:
-                install_cmd = f"pip install -r {req_file} && "
+                install_cmd = ""
+                if req_file and (temp_dir / req_file).stat().st_size > 0:
+                    install_cmd = f"pip install -r {req_file} && "
+
+                if not has_pytest_files(temp_dir):
+                    (temp_dir / "test_smoke_generated.py").write_bytes(_SMOKE_TEST_PY)
+                    project_commands = f"pip install pytest && {install_cmd}pytest test_smoke_generated.py"
+                else:
+                    project_commands = f"pip install pytest && {install_cmd}pytest"
+
+            elif language == "javascript":
+                is_frontend_project = (temp_dir / "index.html").exists() and (temp_dir / "script.js").exists()
+                if is_frontend_project and not (temp_dir / "package.json").exists():
+                     print("Frontend project detected. Injecting test harness...")
+                     (temp_dir / "package.json").write_bytes(_FRONTEND_PKG_JSON)
+                     (temp_dir / "test_runner.js").write_bytes(_FRONTEND_TEST_RUNNER_JS)
+                elif not (temp_dir / "package.json").exists():
+                     return TestResult(success=False, summary="Invalid Project", output=error_msg)
+
+            container = client.containers.run(
+                image=image_name,
+                volumes={str(temp_dir): {'bind': '/app', 'mode': 'rw'}},
+                working_dir='/app',
+                command=["sh", "-c", project_commands], 
+                detach=True,
+                remove=False 
+            )
+            log_collector = LogCollector(container)
 
-            test_files = list(temp_dir.glob("test_*.py")) + list(temp_dir.glob("*_test.py"))
-            if not test_files:
-                smoke_test = """
-import unittest
-import os
-import importlib
-import sys
-from unittest.mock import MagicMock
-sys.modules["tkinter"] = MagicMock()
-sys.modules["turtle"] = MagicMock()
-sys.modules["pygame"] = MagicMock()
-class TestProjectStructure(unittest.TestCase):
-    def test_files_importable(self):
-        print("\\n--- Checking Project Files ---")
-        files = [f[:-3] for f in os.listdir('.') if f.endswith('.py') and f != 'test_smoke_generated.py']
-        if not files: self.fail("No Python files found!")
-        for module_name in files:
             try:
-                importlib.import_module(module_name)
-                print(f"[OK] Loaded: {module_name}.py") 
+                result = container.wait(timeout=600) 
+                exit_code = result.get("StatusCode", 1) 
             except Exception as e:
-                print(f"[FAIL] Failed: {module_name}.py")
-                self.fail(f"Error importing {module_name}.py: {e}")
-if __name__ == '__main__': unittest.main()
-"""
-                with open(temp_dir / "test_smoke_generated.py", "w", encoding="utf-8") as f:
-                    f.write(smoke_test)
-                project_commands = f"pip install pytest && {install_cmd}pytest test_smoke_generated.py"
-            else:
-                project_commands = f"pip install pytest && {install_cmd}pytest"
-
-        elif language == "javascript":
-            is_frontend_project = (temp_dir / "index.html").exists() and (temp_dir / "script.js").exists()
-            if is_frontend_project and not (temp_dir / "package.json").exists():
-                 print("Frontend project detected. Injecting test harness...")
-                 pkg_json = """{"name": "frontend-test","version": "1.0.0","scripts": {"test": "node test_runner.js"},"dependencies": {"jsdom": "^24.0.0"}}"""
-                 with open(temp_dir / "package.json", "w", encoding="utf-8") as f: f.write(pkg_json)
-                 test_runner = """const fs = require('fs'); const jsdom = require("jsdom"); const { JSDOM } = jsdom; try { const html = fs.readFileSync('index.html', 'utf8'); const scriptContent = fs.readFileSync('script.js', 'utf8'); const dom = new JSDOM(html, { runScripts: "dangerously", resources: "usable" }); const { window } = dom; window.eval(scriptContent); console.log("[OK] script.js loaded successfully."); console.log("[OK] DOM initialized successfully."); } catch (error) { console.error("[FAIL] Test Failed:", error); process.exit(1); }"""
-                 with open(temp_dir / "test_runner.js", "w", encoding="utf-8") as f: f.write(test_runner)
-            elif not (temp_dir / "package.json").exists():
-                 return TestResult(success=False, summary="Invalid Project", output=error_msg)
-
-        container = client.containers.run(
-            image=image_name,
-            volumes={str(temp_dir): {'bind': '/app', 'mode': 'rw'}},
-            working_dir='/app',
-            command=["sh", "-c", project_commands], 
-            detach=True,
-            remove=False 
-        )
+                return TestResult(
+                    success=False,
+                    summary="Project execution timed out (10 minutes).",
+                    output=f"Timeout: The project run exceeded the 10-minute limit."
+                )
 
-        try:
-            result = container.wait(timeout=600) 
-            exit_code = result.get("StatusCode", 1) 
-        except Exception as e:
-            return TestResult(
-                success=False,
-                summary="Project execution timed out (10 minutes).",
-                output=f"Timeout: The project run exceeded the 10-minute limit."
-            )
+            logs = log_collector.result()
 
-        logs = container.logs(stdout=True, stderr=True).decode('utf-8')
-
-        if exit_code == 0:
-            return TestResult(success=True, summary="All project tests passed!", output=logs)
-        else:
-            return TestResult(success=False, summary="Project Tests Failed", output=logs)
+            if exit_code == 0:
+                return TestResult(success=True, summary="All project tests passed!", output=logs)
+            else:
+                return TestResult(success=False, summary="Project Tests Failed", output=logs)
 
-    except Exception as e:
-        return TestResult(success=False, summary="Docker Execution Error", output=f"An unexpected error occurred: {str(e)}")
-    finally:
-        if container:
-            try: container.stop(timeout=1); container.remove(v=True, force=True)
-            except: pass 
-        if temp_dir.exists():
-             shutil.rmtree(temp_dir, ignore_errors=True)
+        except Exception as e:
+            return TestResult(success=False, summary="Docker Execution Error", output=f"An unexpected error occurred: {str(e)}")
+        finally:
+            if container:
+                # force=True kills a still-running container, so no separate stop() call
+                try: container.remove(v=True, force=True)
+                except: pass 
 
 
 # --- API Endpoints ---
@@ -359,7 +707,8 @@ if __name__ == '__main__': unittest.main()
 @app.post("/run-test")
 async def run_test(payload: CodeInput) -> TestResult:
     try:
-        return run_in_docker(payload.language, payload.code, payload.test_code)
+        # Docker calls block, so run them in a worker thread to keep the event loop free
+        return await asyncio.to_thread(run_in_docker, payload.language, payload.code, payload.test_code)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
@@ -368,6 +717,6 @@ async def run_project_zip(language: str = Form(...), zip_file: UploadFile = File
     if not zip_file.filename.endswith(".zip"):
         raise HTTPException(status_code=400, detail="Invalid file type. Please upload a .zip file.")
     try:
-        return run_project_in_docker(language, zip_file)
+        return await asyncio.to_thread(run_project_in_docker, language, zip_file)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,36 @@
+from unittest import mock
+
+# main connects to Docker at import time; these helpers never touch it
+with mock.patch("docker.from_env"):
+    from main import _JAVA_PACKAGE_RE, find_package, find_public_class
+
+
+def regex_package(source):
+    match = _JAVA_PACKAGE_RE.search(source)
+    return match.group(1) if match else None
+
+
+def test_find_package_agrees_with_regex():
+    sources = [
+        "package a.b.c;\nclass A {}",
+        "package   a.b;\n",
+        "package a.b.c ;\nclass A {}",
+        "package a.b\n;\nclass A {}",
+        "package a..b;\n",
+        "// header\npackage a.b;\n",
+        "class A {}",
+    ]
+    for source in sources:
+        assert find_package(source) == regex_package(source), source
+
+
+def test_find_package_rejects_whitespace_before_semicolon():
+    assert find_package("package a.b.c ;") is None
+    assert find_package("package a.b\n;") is None
+
+
+def test_find_public_class():
+    assert find_public_class("public class Foo {") == "Foo"
+    assert find_public_class("public class Foo{") == "Foo"
+    assert find_public_class("public final class Box<T> {") is None
+    assert find_public_class("// a class here\npublic class Bar<T> {") == "Bar"
@@ -1,27 +1,108 @@
 import os
-import httpx
+import aiohttp
+import orjson
 import asyncio
+import random
 import re
+import hashlib
+import redis.asyncio as redis
+from typing import Literal
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.background import BackgroundTask
 
 # --- Configuration ---
 
 # 1. Load environment variables from .env
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One HTTP session per worker, so connections to Gemini are kept alive between requests
+    app.state.http = aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=30),
+        # Idle connections are kept for a minute (aiohttp's default is 15s) so
+        # bursts of requests reuse the same TLS sessions to Gemini
+        connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300, keepalive_timeout=60),
+    )
+    app.state.payload_templates = build_payload_templates()
+    app.state.redis = redis.from_url(
+        REDIS_URL,
+        # An unreachable cache must not slow requests down, only miss
+        socket_connect_timeout=REDIS_TIMEOUT,
+        socket_timeout=REDIS_TIMEOUT,
+    ) if REDIS_URL else None
+    yield
+    if app.state.redis is not None:
+        await app.state.redis.aclose()
+    await app.state.http.close()
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+class FastCORS:
+    """
+    Minimal pure-ASGI CORS for a fixed origin allowlist. Header values are
+    pre-encoded, and preflight requests are answered without reaching FastAPI.
+    """
+
+    def __init__(self, app, origins):
+        self.app = app
+        self._allowed = {origin.encode("latin-1") for origin in origins}
+        self._response_headers = [
+            (b"access-control-allow-credentials", b"true"),
+            (b"vary", b"Origin"),
+        ]
+        self._preflight_headers = [
+            (b"access-control-allow-credentials", b"true"),
+            (b"access-control-allow-methods", b"DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"),
+            (b"access-control-max-age", b"600"),
+            (b"vary", b"Origin"),
+            (b"content-type", b"text/plain; charset=utf-8"),
+            (b"content-length", b"2"),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = request_method = request_headers = None
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-method":
+                request_method = value
+            elif name == b"access-control-request-headers":
+                request_headers = value
+
+        if origin not in self._allowed:
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            headers = [(b"access-control-allow-origin", origin), *self._preflight_headers]
+            if request_headers is not None:
+                headers.append((b"access-control-allow-headers", request_headers))
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send({"type": "http.response.body", "body": b"OK"})
+            return
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"access-control-allow-origin", origin),
+                    *self._response_headers,
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
 
 # Allow CORS for your React frontend
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:5173", "http://127.0.0.1:5173"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+app.add_middleware(FastCORS, origins=["http://localhost:5173", "http://127.0.0.1:5173"])
 
 # 2. Get API key
 API_KEY = os.environ.get("GOOGLE_API_KEY")
@@ -34,7 +115,37 @@ if not API_KEY:
     # We don't raise error here so the server can start and print the log, 
     # but requests will fail.
 
-GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-09-2025:generateContent?key={API_KEY}"
+GEMINI_MODEL = "models/gemini-2.5-flash-preview-09-2025"
+GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/{GEMINI_MODEL}:generateContent?key={API_KEY}"
+GEMINI_STREAM_URL = f"https://generativelanguage.googleapis.com/v1beta/{GEMINI_MODEL}:streamGenerateContent?alt=sse&key={API_KEY}"
+
+# Retries for failed Gemini calls; only transient statuses are retried
+GEMINI_MAX_RETRIES = max(1, int(os.environ.get("GEMINI_MAX_RETRIES", "3")))
+GEMINI_RETRY_CAP = float(os.environ.get("GEMINI_RETRY_CAP", "30"))
+# Overall budget for a Gemini call, retries and backoff included
+GEMINI_DEADLINE = float(os.environ.get("GEMINI_DEADLINE", "45"))
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# 3. Optional Redis response cache; identical submissions are answered from it
+REDIS_URL = os.environ.get("REDIS_URL")
+RESPONSE_CACHE_TTL = 24 * 60 * 60
+REDIS_TIMEOUT = float(os.environ.get("REDIS_TIMEOUT", "0.3"))
+
+# Longest submission forwarded to Gemini, in characters
+MAX_INPUT_CHARS = 60_000
+
+GENERATION_CONFIG = {
+    "temperature": 0.4,
+    "top_p": 1.0,
+    "top_k": 32,
+    "maxOutputTokens": 8192,
+}
+# Stands in for the user's code in the pre-serialized request bodies
+USER_CODE_PLACEHOLDER = "__USER__"
+
+# Markdown fence cleanup for replies that do not start with a fence
+_FENCE_RE = re.compile(r"```\w*\n(.*?)```", re.DOTALL)
+_FENCE_STRIP_RE = re.compile(r"```(?:python|javascript|java)?")
 
 # --- Prompts ---
 
@@ -72,78 +183,338 @@ RULES:
 6. Print `All tests passed!` at the end.
 """
 
+_PROMPTS: dict[str, str] = {
+    "python": PYTHON_SYSTEM_PROMPT,
+    "javascript": JAVASCRIPT_SYSTEM_PROMPT,
+    "java": JAVA_SYSTEM_PROMPT,
+}
+
 # --- API Models ---
 
 class UserInput(BaseModel):
-    text: str
-    language: str = "python"
+    text: str = Field(min_length=1)
+    language: Literal["python", "javascript", "java"] = "python"
 
 class AIResponse(BaseModel):
     response: str
 
 # --- Helper for Async HTTP ---
 
-async def generate_with_retry(client, payload):
-    max_retries = 3
-    delay = 1
-    for attempt in range(max_retries):
+async def check_response(response):
+    if response.status >= 400:
+        # Keep Gemini's error body; raise_for_status() would discard it
+        body = await response.read()
+        raise aiohttp.ClientResponseError(
+            response.request_info,
+            response.history,
+            status=response.status,
+            message=body.decode("utf-8", "replace"),
+            headers=response.headers,
+        )
+
+async def post_json(session, url, body):
+    async with session.post(
+        url,
+        data=body,
+        headers={"Content-Type": "application/json"},
+    ) as response:
+        await check_response(response)
+        return orjson.loads(await response.read())
+
+def retry_delay(attempt, retry_after=None):
+    # Honor the server's Retry-After; otherwise "full jitter" exponential backoff
+    if retry_after is not None:
+        try:
+            return min(GEMINI_RETRY_CAP, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(GEMINI_RETRY_CAP, 2 ** attempt))
+
+async def with_retry(send):
+    for attempt in range(GEMINI_MAX_RETRIES):
         try:
-            response = await client.post(GEMINI_API_URL, json=payload, timeout=30.0)
-            response.raise_for_status()
-            return response.json()
-        except (httpx.RequestError, httpx.HTTPStatusError) as e:
-            if attempt == max_retries - 1:
-                raise e
-            await asyncio.sleep(delay)
-            delay *= 2
+            return await send()
+        except aiohttp.ClientResponseError as e:
+            # 400/401/403 and friends will fail the same way again
+            if e.status not in RETRYABLE_STATUS_CODES or attempt == GEMINI_MAX_RETRIES - 1:
+                raise
+            retry_after = e.headers.get("Retry-After") if e.headers else None
+            await asyncio.sleep(retry_delay(attempt, retry_after))
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if attempt == GEMINI_MAX_RETRIES - 1:
+                raise
+            await asyncio.sleep(retry_delay(attempt))
+
+async def generate_with_retry(session, body):
+    return await with_retry(lambda: post_json(session, GEMINI_API_URL, body))
+
+async def open_stream_with_retry(session, body):
+    """
+    Starts a streamGenerateContent call and returns the open response once
+    Gemini has accepted it. The caller must release() it.
+    """
+    async def send():
+        response = await session.post(
+            GEMINI_STREAM_URL,
+            data=body,
+            headers={"Content-Type": "application/json"},
+            # A long generation may stream for well over the session's 30s total
+            timeout=aiohttp.ClientTimeout(total=None, sock_read=30),
+        )
+        try:
+            await check_response(response)
+        except BaseException:
+            response.release()
+            raise
+        return response
+
+    return await with_retry(send)
+
+# --- Helper for Output Cleanup ---
+
+def clean_generated_code(text):
+    """
+    Removes the markdown code fence around the generated test file.
+    """
+    # Fast path: the reply is wrapped in a fence, as the prompts ask, so keep
+    # what lies between the opening fence line and the last fence. Fences
+    # inside the code (e.g. in a string literal) are kept as they are.
+    s = text.strip()
+    if s.startswith("```") and s.endswith("```"):
+        nl = s.find("\n")
+        if nl != -1:
+            return s[nl + 1:-3].strip()
+
+    # Robust Cleanup using Regex for replies that are not fence-wrapped
+    match = _FENCE_RE.search(text)
+    if match:
+        text = match.group(1)
+    else:
+        text = _FENCE_STRIP_RE.sub("", text)
+    return text.strip()
+
+# --- Helper for Streaming ---
+
+class FenceStripper:
+    """
+    Incrementally removes the opening ```lang line and the closing ``` from
+    streamed model output. Only the last few characters, which could still
+    turn out to be the closing fence, are held back.
+    """
+
+    def __init__(self):
+        self._state = "head"
+        self._pending = ""
+
+    def feed(self, text):
+        self._pending += text
+        if self._state == "head":
+            head = self._pending.lstrip()
+            if head.startswith("```"):
+                newline = head.find("\n")
+                if newline == -1:
+                    return ""
+                self._pending = head[newline + 1:]
+            elif "```".startswith(head):
+                # Nothing yet, or a fence that is still arriving
+                return ""
+            self._state = "start"
+        if self._state == "start":
+            self._pending = self._pending.lstrip()
+            if not self._pending:
+                return ""
+            self._state = "body"
+
+        # Hold back a possible closing fence along with the whitespace around it
+        cut = len(self._pending.rstrip()) - 3
+        while cut > 0 and self._pending[cut - 1].isspace():
+            cut -= 1
+        if cut <= 0:
+            return ""
+        text, self._pending = self._pending[:cut], self._pending[cut:]
+        return text
+
+    def finish(self):
+        tail, self._pending = self._pending, ""
+        if self._state == "head":
+            # Nothing has been emitted yet, so the whole reply can be cleaned at once
+            return clean_generated_code(tail)
+        # Leading whitespace of the held-back tail is part of the code
+        tail = tail.rstrip()
+        if tail.endswith("```"):
+            tail = tail[:-3]
+        return tail.rstrip()
+
+def sse_event(data, event=None):
+    prefix = f"event: {event}\n".encode() if event else b""
+    return prefix + b"data: " + orjson.dumps(data) + b"\n\n"
+
+async def stream_generated_code(app, response, cache_key):
+    """
+    Relays a streamGenerateContent response as SSE "text" events. FenceStripper
+    only handles replies that are a single fenced block; for anything else (e.g.
+    prose around the code) a final "replace" event carries the text as the JSON
+    path would return it, so both kinds of client end up with the same code.
+    """
+    stripper = FenceStripper()
+    pieces = []
+    streamed = []
+    finish_reason = None
+    try:
+        async for line in response.content:
+            if not line.startswith(b"data:"):
+                continue
+            event = orjson.loads(line[5:])
+            for candidate in event.get("candidates", [])[:1]:
+                finish_reason = candidate.get("finishReason", finish_reason)
+                for part in candidate.get("content", {}).get("parts", []):
+                    text = part.get("text", "")
+                    pieces.append(text)
+                    chunk = stripper.feed(text)
+                    if chunk:
+                        streamed.append(chunk)
+                        yield sse_event({"text": chunk})
+        chunk = stripper.finish()
+        if chunk:
+            streamed.append(chunk)
+            yield sse_event({"text": chunk})
+        text = clean_generated_code("".join(pieces))
+        if text != "".join(streamed):
+            yield sse_event({"text": text}, event="replace")
+        yield sse_event({}, event="done")
+        # Only complete replies are cached
+        if text and finish_reason == "STOP":
+            await store_cached_response(app, cache_key, text)
+    except Exception as e:
+        print(f"Streaming error: {e}")
+        yield sse_event({"detail": f"An internal error occurred: {e}"}, event="error")
+    finally:
+        response.release()
+
+# --- Helper for Request Bodies ---
+
+def build_payload_templates():
+    """
+    Pre-serializes each language's generateContent body, leaving a placeholder
+    string where the user's code goes.
+    """
+    templates = {}
+    for language, prompt in _PROMPTS.items():
+        payload = {
+            "systemInstruction": {"parts": [{"text": prompt}]},
+            "contents": [{"parts": [{"text": USER_CODE_PLACEHOLDER}]}],
+            "generationConfig": GENERATION_CONFIG,
+        }
+        templates[language] = orjson.dumps(payload)
+    return templates
+
+# --- Helper for Response Caching ---
+
+def response_cache_key(language, text):
+    digest = hashlib.sha256(f"{language}\n{text}".encode("utf-8")).hexdigest()
+    return f"testgen:{digest}"
+
+async def get_cached_response(app, key):
+    if app.state.redis is None:
+        return None
+    try:
+        cached = await app.state.redis.get(key)
+    except Exception as e:
+        print(f"Response cache lookup failed: {e}")
+        return None
+    return cached.decode("utf-8") if cached is not None else None
+
+async def store_cached_response(app, key, text):
+    if app.state.redis is None:
+        return
+    try:
+        await app.state.redis.set(key, text, ex=RESPONSE_CACHE_TTL)
+    except Exception as e:
+        print(f"Response cache store failed: {e}")
 
 # --- API Endpoint ---
 
-@app.post("/chat")
-async def chat(user_input: UserInput) -> AIResponse:
+# AIResponse documents the JSON body; it is built directly rather than validated
+@app.post("/chat", response_model=AIResponse)
+async def chat(user_input: UserInput, request: Request) -> Response:
     if not API_KEY:
         raise HTTPException(status_code=500, detail="Server Error: API Key missing. Check server logs.")
 
-    if user_input.language == "python":
-        system_prompt = PYTHON_SYSTEM_PROMPT
-    elif user_input.language == "javascript":
-        system_prompt = JAVASCRIPT_SYSTEM_PROMPT
-    elif user_input.language == "java":
-        system_prompt = JAVA_SYSTEM_PROMPT
-    else:
-        raise HTTPException(status_code=400, detail="Unsupported language")
-
-    payload = {
-        "systemInstruction": {"parts": [{"text": system_prompt}]},
-        "contents": [{"parts": [{"text": user_input.text}]}],
-        "generationConfig": {
-            "temperature": 0.4,
-            "top_p": 1.0,
-            "top_k": 32,
-            "maxOutputTokens": 8192,
-        },
-    }
+    # Reject bad input before paying for a Gemini round-trip
+    if len(user_input.text) > MAX_INPUT_CHARS:
+        raise HTTPException(status_code=413, detail="Input too large")
+    if not user_input.text.strip():
+        raise HTTPException(status_code=400, detail="Input is empty")
+
+    # UserInput only admits supported languages, so there is always a template
+    template = request.app.state.payload_templates[user_input.language]
+
+    # Clients that accept text/event-stream get the test file as it is generated
+    wants_stream = "text/event-stream" in request.headers.get("accept", "")
 
     try:
-        async with httpx.AsyncClient() as client:
-            result = await generate_with_retry(client, payload)
-            
-            if "candidates" not in result or not result["candidates"]:
-                raise HTTPException(status_code=500, detail="AI returned no response.")
-                
-            text = result["candidates"][0]["content"]["parts"][0]["text"]
-            
-            # Robust Cleanup using Regex
-            match = re.search(r"```\w*\n(.*?)```", text, re.DOTALL)
-            if match:
-                text = match.group(1)
-            else:
-                text = text.replace("```python", "").replace("```javascript", "").replace("```java", "").replace("```", "")
+        cache_key = response_cache_key(user_input.language, user_input.text)
+        cached = await get_cached_response(request.app, cache_key)
+        if cached is not None:
+            if wants_stream:
+                events = [sse_event({"text": cached}), sse_event({}, event="done")]
+                return StreamingResponse(iter(events), media_type="text/event-stream")
+            return ORJSONResponse({"response": cached})
+
+        # Only the user's code is serialized per request
+        body = template.replace(orjson.dumps(USER_CODE_PLACEHOLDER), orjson.dumps(user_input.text), 1)
+
+        if wants_stream:
+            response = await asyncio.wait_for(
+                open_stream_with_retry(request.app.state.http, body), GEMINI_DEADLINE
+            )
+            # The generator's finally never runs if the client is gone before the
+            # first chunk, so the upstream response is also released afterwards
+            async def release_upstream():
+                response.release()
+
+            return StreamingResponse(
+                stream_generated_code(request.app, response, cache_key),
+                media_type="text/event-stream",
+                background=BackgroundTask(release_upstream),
+            )
+
+        result = await asyncio.wait_for(
+            generate_with_retry(request.app.state.http, body), GEMINI_DEADLINE
+        )
+        
+        if "candidates" not in result or not result["candidates"]:
+            raise HTTPException(status_code=500, detail="AI returned no response.")
             
-            return AIResponse(response=text.strip())
+        candidate = result["candidates"][0]
+        text = clean_generated_code(candidate["content"]["parts"][0]["text"])
+
+        # Empty or truncated (MAX_TOKENS) generations are returned but not cached
+        if text and candidate.get("finishReason") == "STOP":
+            await store_cached_response(request.app, cache_key, text)
+        return ORJSONResponse({"response": text})
 
-    except httpx.HTTPStatusError as e:
-        raise HTTPException(status_code=e.response.status_code, detail=e.response.json())
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="AI service timed out.")
+    except aiohttp.ClientResponseError as e:
+        raise HTTPException(status_code=e.status, detail=e.message)
     except Exception as e:
         print(f"Unhandled error: {e}")
-        raise HTTPException(status_code=500, detail=f"An internal error occurred: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"An internal error occurred: {e}")
+
+# --- Production Runner ---
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # "auto" picks uvloop and httptools (both installed by uvicorn[standard]),
+    # falling back to asyncio/h11 where they are unavailable, e.g. on Windows.
+    # Each worker process builds its own HTTP session, caches and templates.
+    uvicorn.run(
+        "main:app",
+        host=os.environ.get("HOST", "127.0.0.1"),
+        port=int(os.environ.get("PORT", "8000")),
+        workers=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        loop="auto",
+        http="auto",
+    )
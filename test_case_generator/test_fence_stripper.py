@@ -0,0 +1,85 @@
+import asyncio
+from types import SimpleNamespace
+
+import orjson
+
+from main import FenceStripper, clean_generated_code, stream_generated_code
+
+
+def run_stripper(chunks):
+    stripper = FenceStripper()
+    return "".join(stripper.feed(chunk) for chunk in chunks) + stripper.finish()
+
+
+def split_everywhere(text):
+    # Every way of cutting the reply into two chunks
+    return [[text[:i], text[i:]] for i in range(1, len(text))]
+
+
+def test_unfenced_tail_keeps_leading_whitespace():
+    assert run_stripper(["`x = 1`", "\n"]) == "`x = 1`"
+    assert run_stripper(["a + b", "c"]) == "a + bc"
+
+
+def test_chunk_boundaries_match_non_streaming_cleanup():
+    replies = [
+        "```python\nimport unittest\n\nclass T:\n    x = a + bc\n```\n",
+        "```js\nconst a = 1;\n```",
+        "def f():\n    return 1  \n",
+        "```python\ncode```",
+        "```python\nprint('```')\n```",
+    ]
+    for reply in replies:
+        expected = clean_generated_code(reply)
+        for chunks in split_everywhere(reply):
+            assert run_stripper(chunks) == expected, chunks
+
+
+def test_fence_inside_code_is_kept():
+    reply = "```python\nprint('```')\n```"
+    assert clean_generated_code(reply) == "print('```')"
+    assert run_stripper([reply]) == "print('```')"
+
+
+def test_fence_without_newline_keeps_code():
+    assert clean_generated_code("```python code```") == "code"
+    assert run_stripper(["```python code```"]) == "code"
+
+
+class FakeStream:
+    """Stands in for an aiohttp response from streamGenerateContent."""
+
+    def __init__(self, chunks):
+        self.content = self._lines(chunks)
+        self.released = False
+
+    async def _lines(self, chunks):
+        for chunk in chunks:
+            event = {"candidates": [{"content": {"parts": [{"text": chunk}]}}]}
+            yield b"data: " + orjson.dumps(event) + b"\n"
+
+    def release(self):
+        self.released = True
+
+
+def collect_events(chunks):
+    async def collect():
+        app = SimpleNamespace(state=SimpleNamespace(redis=None))
+        response = FakeStream(chunks)
+        events = [event async for event in stream_generated_code(app, response, "key")]
+        assert response.released
+        return events
+
+    return asyncio.run(collect())
+
+
+def test_prose_wrapped_reply_is_replaced_with_the_code_block():
+    reply = ["Here is the code:\n```python\n", "x = 1\n```\nHope it helps."]
+    events = collect_events(reply)
+    assert events[-2] == b'event: replace\ndata: {"text":"x = 1"}\n\n'
+    assert events[-1].startswith(b"event: done")
+
+
+def test_fenced_reply_needs_no_replace():
+    events = collect_events(["```python\nx = 1\n", "```"])
+    assert not any(event.startswith(b"event: replace") for event in events)